@@ -1,8 +1,127 @@
 import json
 import sys
 import requests
+from requests.adapters import HTTPAdapter
 import os
 import re
+from types import MappingProxyType
+
+try:
+    import orjson
+except ImportError: # Fall back to the stdlib json module when orjson is not installed
+    orjson = None
+
+try:
+    import msgspec
+except ImportError: # Without msgspec, json_parse always materialises the full document
+    msgspec = None
+
+if msgspec is not None:
+    class _Result(msgspec.Struct):
+        content: object
+
+    class _Envelope(msgspec.Struct):
+        # Only result.content is declared, so jsonrpc, id and any other keys are skipped while decoding
+        result: _Result | None = None
+
+    # Reused across calls so the schema is only compiled once
+    _ENVELOPE_DECODER = msgspec.json.Decoder(_Envelope)
+
+# Compiled once at import instead of going through the re module cache on every call
+_SSE_PREFIX_RE = re.compile(rb"^(?::[^\n]*\n)*event: message\ndata: ", re.MULTILINE)
+def _loads(data):
+    # msgspec keeps integers beyond 64 bits exact, which orjson cannot (depending on the
+    # version it rejects them or silently turns them into floats). Both msgspec and
+    # json.loads accept str as well as bytes.
+    if msgspec is not None:
+        try:
+            return msgspec.json.decode(data)
+        except msgspec.DecodeError:
+            pass # e.g. lone surrogate escapes, which the stdlib accepts
+    return json.loads(data)
+
+def _dumps(obj, indent=False):
+    # Always returns bytes so callers can hand the result straight to the socket
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+        except orjson.JSONEncodeError:
+            pass # orjson rejects integers beyond 64 bits and lone surrogates; the stdlib encodes both
+    # ensure_ascii=False writes non-ASCII text as raw UTF-8, matching orjson's output
+    encoded = json.dumps(obj, indent=2 if indent else None, ensure_ascii=False)
+    try:
+        return encoded.encode("utf-8")
+    except UnicodeEncodeError: # Lone surrogates have no UTF-8 form; keep them as \u escapes
+        return json.dumps(obj, indent=2 if indent else None).encode("utf-8")
+
+# Error envelopes are filled in directly so no dicts are built just to be serialised
+_ERR_TEMPLATE = b'{"jsonrpc":"2.0","error":{"code":%d,"message":%s},"id":%s}\n'
+
+def _error_response(code, message, request_id):
+    return _ERR_TEMPLATE % (code, _dumps(message), _dumps(request_id))
+
+def _format_content(content_value):
+    # Decoded JSON only ever yields exact built-in types, so identity checks on type() suffice
+    content_type = type(content_value)
+    if content_type is str: # Already a string, returned as-is
+        return content_value
+    if content_type is list or content_type is dict: # If it's a list or dict, convert to string
+        return _dumps(content_value, indent=True).decode("utf-8")
+    return str(content_value) # Other primitive types (numbers, booleans, null)
+
+# Read size for the event stream. urllib3 otherwise reads in small chunks; 128 KiB
+# amortises the per-read syscall overhead on Linux sockets while keeping memory modest
+_SSE_CHUNK_SIZE = 131072
+
+def _sse_event_data(buffer, start, end):
+    # Collect the "data:" field lines of buffer[start:end]; other fields (event:, id:) are ignored.
+    # Lines are located in place so only the data values themselves are copied
+    data_lines = []
+    while start < end:
+        line_end = buffer.find(b"\n", start, end)
+        if line_end < 0:
+            line_end = end
+        if buffer.startswith(b"data:", start, line_end):
+            value_start = start + 5
+            if buffer.startswith(b" ", value_start, line_end):
+                value_start += 1
+            data_lines.append(buffer[value_start:line_end])
+        start = line_end + 1
+    return b"\n".join(data_lines)
+
+def _iter_sse_events(response):
+    # Yields the data payload of each server-sent event as soon as its blank-line
+    # terminator arrives, without building a list of decoded lines first
+    buffer = bytearray()
+    scan_from = 0
+    pending_cr = False
+    for chunk in response.iter_content(chunk_size=_SSE_CHUNK_SIZE):
+        if pending_cr:
+            chunk = b"\r" + chunk
+        # SSE also allows CRLF and bare CR line endings; fold them into LF before scanning.
+        # A trailing CR is held back in case the LF of a CRLF pair arrives in the next chunk
+        pending_cr = chunk.endswith(b"\r")
+        if pending_cr:
+            chunk = chunk[:-1]
+        if b"\r" in chunk:
+            chunk = chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+        buffer += chunk
+        start = 0
+        while True:
+            end = buffer.find(b"\n\n", scan_from)
+            if end < 0:
+                break
+            data = _sse_event_data(buffer, start, end)
+            if data:
+                yield data
+            start = scan_from = end + 2
+        del buffer[:start]
+        # Resume one byte early in case the chunk ended between the two newlines
+        scan_from = max(len(buffer) - 1, 0)
+    if buffer.strip(): # Final event without a trailing blank line
+        data = _sse_event_data(buffer, 0, len(buffer))
+        if data:
+            yield data
 
 def json_parse(stream_content):
     try:
@@ -13,22 +132,34 @@ def json_parse(stream_content):
         # The user's request `final_result = json_parse(complete_stream)` suggests `complete_stream`
         # is expected to be parseable as a single JSON entity.
 
-        # First, strip the "event: message\ndata: " prefix from each potential line
-        cleaned_content = re.sub(r"(?m)^event: message\n^data: ", "", stream_content)
+        # The stream is handled as raw bytes end to end; str input is still accepted
+        if isinstance(stream_content, str):
+            stream_content = stream_content.encode("utf-8")
+
+        if stream_content.lstrip()[:1] in (b"{", b"["):
+            # Bare JSON payload, as passed in by main via _iter_sse_events: nothing to strip
+            cleaned_content = stream_content
+        else:
+            # Raw stream: strip the "event: message\ndata: " prefix (and any ":" comment lines before it)
+            cleaned_content = _SSE_PREFIX_RE.sub(b"", stream_content)
 
-        parsed_data = json.loads(cleaned_content)
+        if msgspec is not None:
+            try:
+                envelope = _ENVELOPE_DECODER.decode(cleaned_content)
+            except msgspec.DecodeError:
+                envelope = None # Invalid JSON or no result.content; the full parse below handles both cases
+            if envelope is not None and envelope.result is not None:
+                return _format_content(envelope.result.content)
+
+        parsed_data = _loads(cleaned_content)
         # Assuming the structure is { "result": { "content": "..." } }
         if isinstance(parsed_data, dict) and "result" in parsed_data and "content" in parsed_data["result"]:
-            content_value = parsed_data["result"]["content"]
-            if isinstance(content_value, (list, dict)): # If it's a list or dict, convert to string
-                return json.dumps(content_value, indent=2)
-            else: # Otherwise, it's already a string or other primitive type
-                return str(content_value) # Ensure it's explicitly a string
+            return _format_content(parsed_data["result"]["content"])
         else:
             # If the expected path is not found, return the full parsed data or handle as error
-            return json.dumps(parsed_data, indent=2) # Return pretty-printed JSON if content not found
+            return _dumps(parsed_data, indent=True).decode("utf-8") # Return pretty-printed JSON if content not found
     except json.JSONDecodeError as e:
-        sys.stderr.write(f"Error decoding JSON from stream: {e}\nContent: {stream_content}\n")
+        sys.stderr.write(f"Error decoding JSON from stream: {e}\nContent: {stream_content.decode('utf-8', 'replace')}\n")
         return f"JSON Decode Error: {e}"
     except Exception as e:
         sys.stderr.write(f"An unexpected error occurred during JSON parsing: {e}\n")
@@ -38,21 +169,72 @@ def json_parse(stream_content):
 WATSON_MCP_ROUTER_URL = os.environ.get("WATSON_MCP_ROUTER_URL", "http://localhost:3000/mcp")
 SESSION_ID_FILE = ".mcp_session_id" # File to store session ID
 
+# Headers sent with every router request; read-only so nothing can mutate them per call
+_BASE_HEADERS = MappingProxyType({
+    "Content-Type": "application/json", # requests leaves bytes bodies untyped, and the router only parses JSON bodies
+    "MCP-Protocol-Version": "2025-06-18", # Add protocol version header
+    "Accept": "application/json; text/event-stream"
+})
+
+# One pooled session so the 'initialize' and request POSTs share a keep-alive connection
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+_SESSION.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+_SESSION.headers.update(_BASE_HEADERS)
+
+# In-process copy of the session id, revalidated against the file's mtime so a
+# session saved by another invocation is still picked up
+_SESSION_ID_CACHE = None
+_SESSION_ID_MTIME = 0
+
 def _get_session_id():
-    if os.path.exists(SESSION_ID_FILE):
-        with open(SESSION_ID_FILE, "r") as f:
-            sid = f.read().strip()
-            # print(f"DEBUG: Loaded session_id from file: {sid}", file=sys.stderr)
-            return sid
-    # print("DEBUG: No session_id file found.", file=sys.stderr)
-    return None
+    global _SESSION_ID_CACHE, _SESSION_ID_MTIME
+    if _SESSION_ID_CACHE is not None:
+        try:
+            if os.stat(SESSION_ID_FILE).st_mtime_ns == _SESSION_ID_MTIME:
+                return _SESSION_ID_CACHE
+        except FileNotFoundError:
+            _SESSION_ID_CACHE = None
+            return None
+    try:
+        # A single open() instead of os.path.exists() + open(); a missing file simply raises
+        with open(SESSION_ID_FILE, "rb", buffering=0) as f:
+            sid = f.read().strip().decode("utf-8")
+            _SESSION_ID_MTIME = os.fstat(f.fileno()).st_mtime_ns
+    except FileNotFoundError:
+        # print("DEBUG: No session_id file found.", file=sys.stderr)
+        return None
+    # print(f"DEBUG: Loaded session_id from file: {sid}", file=sys.stderr)
+    _SESSION_ID_CACHE = sid
+    return sid
 
 def _save_session_id(session_id):
-    with open(SESSION_ID_FILE, "w") as f:
-        f.write(session_id)
+    global _SESSION_ID_CACHE, _SESSION_ID_MTIME
+    fd = os.open(SESSION_ID_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        os.write(fd, session_id.encode("utf-8"))
+        _SESSION_ID_MTIME = os.fstat(fd).st_mtime_ns
+    finally:
+        os.close(fd)
+    _SESSION_ID_CACHE = session_id
     # print(f"DEBUG: Saved new session_id to file: {session_id}", file=sys.stderr)
 
+def _write_stdout(data):
+    # os.write may accept fewer bytes than requested on a pipe, so loop until everything is out
+    view = memoryview(data)
+    while view:
+        view = view[os.write(sys.stdout.fileno(), view):]
+
 def main():
+    # Everything destined for stdout is collected here and written with os.write, bypassing the
+    # TextIOWrapper encode/flush on each response: once before stdin is read and once at the end
+    output = []
+    try:
+        _run(output)
+    finally:
+        _write_stdout(b"".join(output))
+
+def _run(output):
     session_id = _get_session_id() # Load session_id at the start
 
     # --- Initialization Logic ---
@@ -77,16 +259,11 @@ def main():
             },
             "id": 0 # A common ID for initialization
         }
-        # Explicitly encode JSON and set Content-Type
-        init_data = json.dumps(initialize_message)
-        init_headers = {
-            "Content-Type": "application/json",
-            "MCP-Protocol-Version": "2025-06-18", # Add protocol version header
-            "Accept": "application/json; text/event-stream"
-        }
+        # Explicitly encode JSON; Content-Type comes from the session headers
+        init_data = _dumps(initialize_message) # bytes, sent as-is without a re-encode
         try:
-            # print("DEBUG: initialize_message, init_headers",init_data, init_headers)
-            init_response = requests.post(WATSON_MCP_ROUTER_URL, data=init_data, headers=init_headers) # Use data= and init_data
+            # print("DEBUG: initialize_message",init_data)
+            init_response = _SESSION.post(WATSON_MCP_ROUTER_URL, data=init_data) # Use data= and init_data
             init_response.raise_for_status()
             new_session_id = init_response.headers.get("mcp-session-id")
             if new_session_id:
@@ -95,34 +272,15 @@ def main():
                 # print(f"DEBUG: Successfully initialized and saved session_id: {session_id}", file=sys.stderr)
             else:
                 print("WARNING: No mcp-session-id received in initial 'initialize' response.", file=sys.stderr)
-            # Output the initialize response to stdout
-            sys.stdout.write(init_response.text + "\n")
-            sys.stdout.flush()
+            # Queue the initialize response for stdout
+            output.append(init_response.content + b"\n")
             # print(f"DEBUG: Initial 'initialize' response sent to stdout. Response: {init_response.text}", file=sys.stderr) # Added for clarity
         except requests.exceptions.RequestException as e:
-            error_message = {
-                "jsonrpc": "2.0",
-                "error": {
-                    "code": -32003, # Internal error
-                    "message": f"Initial HTTP Request failed during 'initialize': {e}",
-                },
-                "id": initialize_message.get("id", None)
-            }
-            sys.stdout.write(json.dumps(error_message) + "\n")
-            sys.stdout.flush()
+            output.append(_error_response(-32003, f"Initial HTTP Request failed during 'initialize': {e}", initialize_message.get("id", None))) # Internal error
             print(f"Error: Initial 'initialize' HTTP request failed: {e}", file=sys.stderr)
             return # Critical error, cannot proceed without initialization
         except Exception as e:
-            error_message = {
-                "jsonrpc": "2.0",
-                "error": {
-                    "code": -32000, # Server error
-                    "message": f"An unexpected error occurred during initial 'initialize': {e}",
-                },
-                "id": initialize_message.get("id", None)
-            }
-            sys.stdout.write(json.dumps(error_message) + "\n")
-            sys.stdout.flush()
+            output.append(_error_response(-32000, f"An unexpected error occurred during initial 'initialize': {e}", initialize_message.get("id", None))) # Server error
             print(f"Error: An unexpected error occurred during initial 'initialize': {e}", file=sys.stderr)
             return # Critical error, cannot proceed without initialization
     # else:
@@ -130,73 +288,48 @@ def main():
 
     # --- End Initialization Logic ---
 
+    # Emit the initialize response now rather than holding it until stdin reaches EOF
+    if output:
+        _write_stdout(b"".join(output))
+        output.clear()
+
     # Read the actual command input from stdin
-    full_input = sys.stdin.read()
+    full_input = sys.stdin.buffer.read() # Kept as bytes; orjson and str.find-style scans work on them directly
 
     message = None
     json_content = None
 
-    # Try to find content between ```json ... ```
-    json_match = re.search(r"```json\s*(.*?)\s*```", full_input, re.DOTALL)
+    # Try to find content between ```json ... ``` with two substring scans rather than a regex
+    fence_start = full_input.find(b"```json")
+    fence_end = full_input.find(b"```", fence_start + 7) if fence_start >= 0 else -1
 
-    if json_match:
-        json_content = json_match.group(1)
+    if fence_end >= 0:
+        json_content = full_input[fence_start + 7:fence_end].strip()
         try:
             # Attempt to parse the extracted JSON content
-            message = json.loads(json_content)
+            message = _loads(json_content)
         except json.JSONDecodeError:
-            error_message = {
-                "jsonrpc": "2.0",
-                "error": {
-                    "code": -32700, # Parse error
-                    "message": f"Error: Could not decode JSON from extracted content: {json_content.strip()}",
-                },
-                "id": None
-            }
-            sys.stdout.write(json.dumps(error_message) + "\n")
-            sys.stdout.flush()
-            print(f"Error: Could not decode JSON from extracted content: {json_content.strip()}", file=sys.stderr)
+            output.append(_error_response(-32700, f"Error: Could not decode JSON from extracted content: {json_content.decode('utf-8', 'replace')}", None)) # Parse error
+            print(f"Error: Could not decode JSON from extracted content: {json_content.decode('utf-8', 'replace')}", file=sys.stderr)
             return # Exit if the extracted content is not valid JSON
-    elif full_input.strip() == "":
+    elif full_input.strip() == b"":
         # If no input is provided after initialization, the script just exits after handling initialization.
         # This is expected if the script is run without any piped input.
         # print("DEBUG: No further input received after initialization. Exiting.", file=sys.stderr)
         return
     else:
-        error_message = {
-            "jsonrpc": "2.0",
-            "error": {
-                "code": -32700, # Parse error
-                "message": "Error: Could not find JSON content within ```json ... ``` block or empty input.",
-            },
-            "id": None
-        }
-        sys.stdout.write(json.dumps(error_message) + "\n")
-        sys.stdout.flush()
+        output.append(_error_response(-32700, "Error: Could not find JSON content within ```json ... ``` block or empty input.", None)) # Parse error
         print("Error: Could not find JSON content within ```json ... ``` block or empty input.", file=sys.stderr)
         return # Exit if the expected format is not found
 
     # If we reached here, 'message' contains a valid JSON-RPC request (not an 'initialize' from empty input)
-    headers = {
-        "Content-Type": "application/json", # Ensures JSON-RPC requests are sent with correct content type
-        "MCP-Protocol-Version": "2025-06-18", # Add protocol version header
-        "Accept": "application/json; text/event-stream"
-    }
+    headers = {} # Only per-request headers; _BASE_HEADERS are merged in by the session
     if session_id:
         headers["mcp-session-id"] = session_id
     else:
         # This case should ideally not happen if initialization was successful.
         # If it does, it means we couldn't get a session_id, so we can't send a request that requires it.
-        error_message = {
-            "jsonrpc": "2.0",
-            "error": {
-                "code": -32003, # Internal error
-                "message": "Session ID not available after initialization attempt.",
-            },
-            "id": message.get("id", None)
-        }
-        sys.stdout.write(json.dumps(error_message) + "\n")
-        sys.stdout.flush()
+        output.append(_error_response(-32003, "Session ID not available after initialization attempt.", message.get("id", None))) # Internal error
         print("Error: Session ID not available. Cannot send request.", file=sys.stderr)
         return
 
@@ -215,7 +348,7 @@ def main():
 
         # Send the request with the constructed headers
         # print(f"DEBUG: Sending message: {message} with headers: {headers}", file=sys.stderr)
-        response = requests.post(WATSON_MCP_ROUTER_URL, data=json.dumps(message), headers=headers) # Use data= and json.dumps(message)
+        response = _SESSION.post(WATSON_MCP_ROUTER_URL, data=_dumps(message), headers=headers, stream=True) # Body is read by _iter_sse_events or response.content
 
         response.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
 
@@ -236,46 +369,24 @@ def main():
         content_type = response.headers.get("Content-Type")
 
         if content_type == "text/event-stream":
-            full_stream_content = []
-            for line in response.iter_lines():
-                if line: # Filter out keep-alive new lines
-                    full_stream_content.append(line.decode("utf-8"))
-
-            # Join all lines to form the complete stream content
-            complete_stream = "\n".join(full_stream_content)
+            # The JSON-RPC response is the last event on the stream; any earlier events are
+            # notifications sent while the request was being handled
+            final_event = b""
+            for event_data in _iter_sse_events(response):
+                final_event = event_data
 
-            final_result = json_parse(complete_stream)
+            final_result = json_parse(final_event)
 
-            sys.stdout.write(final_result + "\n")
-            sys.stdout.flush()
+            output.append(final_result.encode("utf-8") + b"\n")
         else:
-            # Output the raw response text to stdout
-            sys.stdout.write(response.text + "\n")
-            sys.stdout.flush()
+            # Queue the raw response body for stdout
+            output.append(response.content + b"\n")
 
     except requests.exceptions.RequestException as e:
-        error_message = {
-            "jsonrpc": "2.0",
-            "error": {
-                "code": -32003, # Internal error
-                "message": f"HTTP Request failed: {e}",
-            },
-            "id": message.get("id", None)
-        }
-        sys.stdout.write(json.dumps(error_message) + "\n")
-        sys.stdout.flush()
+        output.append(_error_response(-32003, f"HTTP Request failed: {e}", message.get("id", None))) # Internal error
         print(f"Error: HTTP request failed: {e}", file=sys.stderr)
     except Exception as e:
-        error_message = {
-            "jsonrpc": "2.0",
-            "error": {
-                "code": -32000, # Server error
-                "message": f"An unexpected error occurred: {e}",
-            },
-            "id": message.get("id", None)
-        }
-        sys.stdout.write(json.dumps(error_message) + "\n")
-        sys.stdout.flush()
+        output.append(_error_response(-32000, f"An unexpected error occurred: {e}", message.get("id", None))) # Server error
         print(f"Error: An unexpected error occurred: {e}", file=sys.stderr)
 
 